@@ -9,9 +9,18 @@ import os
 import re
 import glob
 import argparse
+import hashlib
+import json
+import signal
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
+from typing import List, Dict, Optional, Set, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
 
 
@@ -21,18 +30,99 @@ class SearchState(Enum):
     SEARCH_END = 2
 
 
+class UnsafePatternError(ValueError):
+    """正则模式存在灾难性回溯风险"""
+
+
+class DirectiveTimeout(Exception):
+    """验证指令执行超出时间预算"""
+
+
+# 量词作用在自身含无界量词的分组上，如 (a+)+、(\w*)*、(a|b+){2,}
+NESTED_QUANTIFIER = re.compile(r'\((?:[^()\\]|\\.)*[*+](?:[^()\\]|\\.)*\)(?:[*+]|\{\d+,\d*\})')
+BACKREFERENCE = re.compile(r'\\[1-9]')
+
+
+def check_pattern(pattern: str) -> Optional[str]:
+    """分析正则模式的回溯风险，返回风险说明，没有发现风险时返回None
+
+    只识别最常见的嵌套量词和反向引用，更复杂的情况由指令执行时间预算兜底。
+    """
+    if NESTED_QUANTIFIER.search(pattern):
+        return "nested quantifier"
+    if BACKREFERENCE.search(pattern):
+        return "backreference"
+    return None
+
+
+@lru_cache(maxsize=256)
+def _compile_pattern(pattern: str) -> 're.Pattern':
+    """检查并编译正则模式，有回溯风险时抛出UnsafePatternError"""
+    reason = check_pattern(pattern)
+    if reason:
+        raise UnsafePatternError(f"Unsafe pattern /{pattern}/: {reason}")
+    return re.compile(pattern)
+
+
+@contextmanager
+def directive_time_budget(seconds: Optional[float]):
+    """为一条验证指令设置执行时间预算，超时抛出DirectiveTimeout
+
+    依赖SIGALRM，只在主线程且平台支持时生效；正则匹配过程中也能被打断。
+    """
+    if not seconds or not hasattr(signal, 'setitimer') \
+            or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def on_timeout(signum, frame):
+        raise DirectiveTimeout()
+
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
 @dataclass
 class IRScope:
     """IR搜索范围"""
     lines: List[str]
     name: str
     current_index: int = 0
+    # 所属IR文件的行号索引，lines对应索引中 [offset, offset + len(lines)) 的行
+    index: Optional['IRIndex'] = None
+    offset: int = 0
+    _graph: Optional['IRGraph'] = field(default=None, init=False, repr=False)
+
+    @property
+    def graph(self) -> 'IRGraph':
+        """按需解析得到的IR指令图（首次访问时构建并缓存）"""
+        if self._graph is None:
+            if self.index is not None and self.offset == 0 and len(self.lines) == len(self.index.lines):
+                # 整个文件的范围直接复用索引上缓存的指令图
+                self._graph = self.index.graph
+            else:
+                self._graph = IRGraph(self.lines)
+        return self._graph
 
     def find(self, match: str) -> Optional[str]:
         """查找匹配的行"""
         if not match:
             return None
 
+        hit = self._indexed_range(match, self.current_index)
+        if hit is not None:
+            positions, lo, hi = hit
+            if lo == hi:
+                return None
+            i = positions[lo] - self.offset
+            self.current_index = i + 1
+            return self.lines[i]
+
         for i, line in enumerate(self.lines[self.current_index:], self.current_index):
             if self._contains(line, match):
                 self.current_index = i + 1
@@ -41,20 +131,18 @@ class IRScope:
 
     def find_next(self, match: str) -> Optional[str]:
         """查找下一个匹配的行"""
-        if not match:
-            return None
-
-        for i, line in enumerate(self.lines[self.current_index:], self.current_index):
-            if self._contains(line, match):
-                self.current_index = i + 1
-                return line
-        return None
+        return self.find(match)
 
     def exists(self, match: str) -> bool:
         """检查是否存在匹配的行"""
         if not match:
             return False
 
+        hit = self._indexed_range(match, self.current_index)
+        if hit is not None:
+            _, lo, hi = hit
+            return lo < hi
+
         for line in self.lines[self.current_index:]:
             if self._contains(line, match):
                 return True
@@ -78,26 +166,39 @@ class IRScope:
 
         # 查找基本块的开始
         start_index = None
-        for i, line in enumerate(self.lines[self.current_index:], self.current_index):
-            if self._contains(line, match):
-                start_index = i
-                break
+        hit = self._indexed_range(match, self.current_index)
+        if hit is not None:
+            positions, lo, hi = hit
+            if lo < hi:
+                start_index = positions[lo] - self.offset
+        else:
+            for i, line in enumerate(self.lines[self.current_index:], self.current_index):
+                if self._contains(line, match):
+                    start_index = i
+                    break
 
         if start_index is None:
             return None
 
         # 查找基本块的结束（下一个基本块开始或文件结束）
         end_index = len(self.lines)
-        for i in range(start_index + 1, len(self.lines)):
+        hit = self._indexed_range("prop:", start_index + 1)
+        if hit is not None:
+            positions, lo, hi = hit
+            candidates = (positions[k] - self.offset for k in range(lo, hi))
+        else:
+            candidates = range(start_index + 1, len(self.lines))
+        for i in candidates:
             line = self.lines[i]
             # 检查是否是新的基本块开始（通常以 "prop:" 开头）
             if line.strip().startswith("prop:"):
                 end_index = i
                 break
 
-        # 创建新的IRScope，只包含该基本块的内容
+        # 创建新的IRScope，只包含该基本块的内容，并共享文件的行号索引
         block_lines = self.lines[start_index:end_index]
-        block_scope = IRScope(block_lines, f"block_{match}", 0)
+        block_scope = IRScope(block_lines, f"block_{match}", 0,
+                              index=self.index, offset=self.offset + start_index)
 
         # 更新当前索引到基本块结束位置
         self.current_index = end_index
@@ -109,18 +210,52 @@ class IRScope:
         if not match:
             return 0
 
+        hit = self._indexed_range(match, 0)
+        if hit is not None:
+            positions, lo, hi = hit
+            return sum(1 for k in range(lo, hi)
+                       if not self.index.lines[positions[k]].startswith("Method:"))
+
         count = 0
         for line in self.lines:
             if self._contains(line, match) and not line.startswith("Method:"):
                 count += 1
         return count
 
-    def _contains(self, line: str, match: str) -> bool:
+    def _indexed_range(self, match: str, start: int) -> Optional[Tuple[List[int], int, int]]:
+        """在行号索引中二分查找本范围内从start开始的命中行
+
+        返回 (positions, lo, hi)，positions[lo:hi] 为命中的文件行号；
+        没有索引或模式无法由索引回答（正则等）时返回None，由调用方回退到逐行扫描。
+        """
+        if self.index is None:
+            return None
+        positions = self.index.positions(match)
+        if positions is None:
+            return None
+        lo = bisect_left(positions, self.offset + start)
+        hi = bisect_left(positions, self.offset + len(self.lines), lo)
+        return positions, lo, hi
+
+    def count_instructions(self, match: str) -> int:
+        """基于指令图统计opcode或调用目标匹配的指令条数（不计操作数中的引用）"""
+        if not match:
+            return 0
+        return len(self.graph.instructions_matching(match))
+
+    def exists_instruction(self, match: str) -> bool:
+        """基于指令图检查当前位置之后是否存在opcode或调用目标匹配的指令"""
+        if not match:
+            return False
+        return any(inst.line_index >= self.current_index
+                   for inst in self.graph.instructions_matching(match))
+
+    @staticmethod
+    def _contains(line: str, match: str) -> bool:
         """检查行是否包含匹配模式"""
         if match.startswith('/') and match.endswith('/'):
             # 正则表达式匹配
-            pattern = match[1:-1]
-            return bool(re.search(pattern, line))
+            return bool(_compile_pattern(match[1:-1]).search(line))
         else:
             # 字符串匹配
             return match in line
@@ -136,11 +271,463 @@ class IRScope:
         return cls(lines, name)
 
 
+class IRIndex:
+    """IR文件的行号索引：字面模式 -> 包含它的有序行号列表
+
+    同一文件被反复查询时才建立：第BUILD_AFTER次字面查询时把整个文件拼成一段文本，
+    之后每个新模式用 str.find 在整段文本上查找一次（C实现，不逐行执行Python代码），
+    命中位置二分换算成行号并缓存；IRScope在缓存的行号列表上二分处理游标和基本块范围。
+    """
+
+    # 同一文件上第几次字面查询时建立索引，只查询一两次的文件直接逐行扫描
+    BUILD_AFTER = 2
+
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        self._text: Optional[str] = None
+        self._line_starts: List[int] = []
+        self._queries = 0
+        self._positions_cache: Dict[str, List[int]] = {}
+        self._graph: Optional['IRGraph'] = None
+
+    @property
+    def graph(self) -> 'IRGraph':
+        """整个文件的IR指令图（首次访问时构建并缓存）"""
+        if self._graph is None:
+            self._graph = IRGraph(self.lines)
+        return self._graph
+
+    @property
+    def built(self) -> bool:
+        """索引是否已经建立"""
+        return self._text is not None
+
+    def build(self):
+        """拼接整个文件并记录每行的起始位置"""
+        if self._text is not None:
+            return
+        line_starts = []
+        offset = 0
+        for line in self.lines:
+            line_starts.append(offset)
+            offset += len(line)
+        self._line_starts = line_starts
+        self._text = "".join(self.lines)
+
+    def positions(self, match: str) -> Optional[List[int]]:
+        """返回包含字面模式的有序行号列表
+
+        正则、含换行的模式以及索引尚未建立时返回None，由调用方逐行扫描。
+        """
+        if match.startswith('/') and match.endswith('/'):
+            return None
+        if '\n' in match:
+            return None
+
+        positions = self._positions_cache.get(match)
+        if positions is not None:
+            return positions
+
+        if self._text is None:
+            self._queries += 1
+            if self._queries < self.BUILD_AFTER:
+                return None
+            self.build()
+
+        positions = []
+        text = self._text
+        line_starts = self._line_starts
+        pos = text.find(match)
+        while pos != -1:
+            line_index = bisect_right(line_starts, pos) - 1
+            positions.append(line_index)
+            if line_index + 1 >= len(line_starts):
+                break
+            # 每行只记录一次，从下一行开头继续查找
+            pos = text.find(match, line_starts[line_index + 1])
+        self._positions_cache[match] = positions
+        return positions
+
+    @classmethod
+    def from_file(cls, filename: str) -> 'IRIndex':
+        """从文件创建索引"""
+        if not os.path.exists(filename):
+            raise FileNotFoundError(f"File not found: {filename}")
+
+        with open(filename, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        return cls(lines)
+
+
+@dataclass
+class PassChanges:
+    """某个pass相对前一个dump的行级变化"""
+    ir_file: str
+    added: List[str]
+    removed: List[str]
+
+
+class IRHistory:
+    """方法的pass历史
+
+    第一个dump按需读入后保存全文（base），之后每个dump只在查询变化时才用patience diff计算
+    相对前一个dump的行级差异并保存（``(i1, i2, new_lines)``：把前一个dump的
+    [i1, i2) 行替换为new_lines）。选择pass时只读入对应的一个文件，不做diff。
+    """
+
+    def __init__(self, ir_files: List[str]):
+        self.ir_files = ir_files
+        self.base: Optional[List[str]] = None
+        # 第i个dump相对第i-1个dump的差异，按需计算
+        self.deltas: Dict[int, List[Tuple[int, int, List[str]]]] = {}
+
+    def _read(self, file_index: int) -> List[str]:
+        """读入第file_index个dump"""
+        ir_file = self.ir_files[file_index]
+        if not os.path.exists(ir_file):
+            raise FileNotFoundError(f"File not found: {ir_file}")
+        with open(ir_file, 'r', encoding='utf-8') as f:
+            return f.readlines()
+
+    @staticmethod
+    def _diff(old: List[str], new: List[str]) -> List[Tuple[int, int, List[str]]]:
+        """patience diff，O(n log n)
+
+        两侧都只出现一次的行构成 (old位置, new位置) 对，按new位置排列后取old位置的
+        最长递增子序列作为锚点，移动的单行（如被外提的指令）只算作一次删除和一次新增；
+        锚点之间从两端扩展相同的行，剩下的部分记为替换。
+        """
+        old_counts = Counter(old)
+        new_counts = Counter(new)
+        old_positions = {line: i for i, line in enumerate(old) if old_counts[line] == 1}
+        pairs = [(old_positions[line], j) for j, line in enumerate(new)
+                 if new_counts[line] == 1 and line in old_positions]
+
+        # 最长递增子序列：tails[k]为长度k+1的子序列末尾在pairs中的下标
+        tails: List[int] = []
+        tail_values: List[int] = []
+        previous = [-1] * len(pairs)
+        for k, (i, _) in enumerate(pairs):
+            length = bisect_left(tail_values, i)
+            if length > 0:
+                previous[k] = tails[length - 1]
+            if length == len(tails):
+                tails.append(k)
+                tail_values.append(i)
+            else:
+                tails[length] = k
+                tail_values[length] = i
+        anchors = []
+        k = tails[-1] if tails else -1
+        while k != -1:
+            anchors.append(pairs[k])
+            k = previous[k]
+        anchors.reverse()
+        anchors.append((len(old), len(new)))
+
+        delta = []
+        i = j = 0
+        for anchor_i, anchor_j in anchors:
+            while i < anchor_i and j < anchor_j and old[i] == new[j]:
+                i += 1
+                j += 1
+            end_i, end_j = anchor_i, anchor_j
+            while end_i > i and end_j > j and old[end_i - 1] == new[end_j - 1]:
+                end_i -= 1
+                end_j -= 1
+            if i < end_i or j < end_j:
+                delta.append((i, end_i, new[j:end_j]))
+            i, j = anchor_i + 1, anchor_j + 1
+        return delta
+
+    @staticmethod
+    def _apply(lines: List[str], delta: List[Tuple[int, int, List[str]]]) -> List[str]:
+        """把差异应用到前一个dump上"""
+        result = []
+        pos = 0
+        for i1, i2, new_lines in delta:
+            result.extend(lines[pos:i1])
+            result.extend(new_lines)
+            pos = i2
+        result.extend(lines[pos:])
+        return result
+
+    def lines_at(self, file_index: int) -> List[str]:
+        """返回第file_index个dump的全文
+
+        差异链已经完整时由base还原，否则直接读入该文件。
+        """
+        if file_index == 0:
+            if self.base is None:
+                self.base = self._read(0)
+            return self.base
+
+        if self.base is not None and all(i in self.deltas for i in range(1, file_index + 1)):
+            lines = self.base
+            for i in range(1, file_index + 1):
+                lines = self._apply(lines, self.deltas[i])
+            return lines
+        return self._read(file_index)
+
+    def changes(self, file_index: int) -> PassChanges:
+        """返回第file_index个dump相对前一个dump的变化，第一个dump视为全部新增"""
+        ir_file = self.ir_files[file_index]
+        if file_index == 0:
+            return PassChanges(ir_file, list(self.lines_at(0)), [])
+
+        previous = self.lines_at(file_index - 1)
+        delta = self.deltas.get(file_index)
+        if delta is None:
+            delta = self._diff(previous, self._read(file_index))
+            self.deltas[file_index] = delta
+
+        added: List[str] = []
+        removed: List[str] = []
+        for i1, i2, new_lines in delta:
+            removed.extend(previous[i1:i2])
+            added.extend(new_lines)
+        return PassChanges(ir_file, added, removed)
+
+
+@dataclass
+class IRInstruction:
+    """IR指令记录"""
+    id: Optional[str]
+    opcode: str
+    operands: List[str]
+    block: Optional[str]
+    line_index: int
+    # 调用指令的目标方法，如 CallStatic 的 std.core.StringBuilder::<ctor>
+    target: Optional[str] = None
+    users: List['IRInstruction'] = field(default_factory=list, repr=False)
+
+
+@dataclass
+class IRBlock:
+    """IR基本块"""
+    id: str
+    props: str = ""
+    instructions: List[IRInstruction] = field(default_factory=list)
+
+
+class IRGraph:
+    """解析后的IR模型：指令、def-use边以及opcode索引
+
+    同时支持Ark的dump格式（``2.ref  Intrinsic.StdCoreSbAppendString v1, v0 -> (v8)``）
+    和示例文件中的简化格式（``v1 = Intrinsic.StdCoreSbAppendString(v0, v2)``）。
+    """
+
+    BLOCK_HEADER = re.compile(r'^\s*BB\s+(\d+)(.*)$')
+    BLOCK_PROPS = re.compile(r'^\s*prop:\s*(.*)$')
+    # Ark格式: "<id>.<type>  <opcode> <operands> -> (<users>)"
+    ARK_INST = re.compile(r'^\s*(\d+p?)\.(\S+)\s+(\S+)(.*)$')
+    # 简化格式: "v<id> = <opcode>(<operands>)"
+    ASSIGN_INST = re.compile(r'^\s*(v\d+p?)\s*=\s*([^\s(]+)\s*\((.*)\)\s*$')
+    # 简化格式中没有定义值的指令，如 "return v5"
+    BARE_INST = re.compile(r'^\s*([A-Za-z_]\w*)\s+(v\d+p?(?:\s*,\s*v\d+p?)*)\s*$')
+    OPERAND = re.compile(r'\bv(\d+p?)\b')
+
+    def __init__(self, lines: List[str]):
+        self.instructions: List[IRInstruction] = []
+        self.definitions: Dict[str, IRInstruction] = {}
+        self.blocks: Dict[str, IRBlock] = {}
+        self.opcode_index: Dict[str, List[IRInstruction]] = {}
+        self.target_index: Dict[str, List[IRInstruction]] = {}
+        self._parse(lines)
+        self._link_users()
+
+    def _parse(self, lines: List[str]):
+        """逐行解析指令与基本块"""
+        block: Optional[IRBlock] = None
+        for line_index, line in enumerate(lines):
+            header = self.BLOCK_HEADER.match(line)
+            if header:
+                props = re.search(r'\(([^)]*)\)', header.group(2))
+                block = IRBlock(header.group(1), props.group(1) if props else "")
+                self.blocks[block.id] = block
+                continue
+
+            props = self.BLOCK_PROPS.match(line)
+            if props:
+                if block is None:
+                    # 基本块范围（IN_BLOCK）从prop行开始，没有BB头
+                    block = IRBlock("")
+                    self.blocks[block.id] = block
+                block.props = props.group(1).strip()
+                continue
+
+            inst = self._parse_instruction(line, line_index, block.id if block else None)
+            if inst is None:
+                continue
+            self.instructions.append(inst)
+            if inst.id is not None:
+                self.definitions[inst.id] = inst
+            self.opcode_index.setdefault(inst.opcode, []).append(inst)
+            if inst.target is not None:
+                self.target_index.setdefault(inst.target, []).append(inst)
+            if block is not None:
+                block.instructions.append(inst)
+
+    def _parse_instruction(self, line: str, line_index: int,
+                           block: Optional[str]) -> Optional[IRInstruction]:
+        """解析单行指令，不是指令时返回None"""
+        if line.lstrip().startswith(("Method:", "succs:", "#")):
+            return None
+
+        ark = self.ARK_INST.match(line)
+        if ark:
+            operands_text = ark.group(4).split('->', 1)[0]
+            operands = [f"v{ref}" for ref in self.OPERAND.findall(operands_text)]
+            targets = [token for token in operands_text.replace(',', ' ').split() if '::' in token]
+            return IRInstruction(f"v{ark.group(1)}", ark.group(3), operands, block, line_index,
+                                 targets[0] if targets else None)
+
+        assign = self.ASSIGN_INST.match(line)
+        if assign:
+            operands = [f"v{ref}" for ref in self.OPERAND.findall(assign.group(3))]
+            return IRInstruction(assign.group(1), assign.group(2), operands, block, line_index)
+
+        bare = self.BARE_INST.match(line)
+        if bare:
+            operands = [f"v{ref}" for ref in self.OPERAND.findall(bare.group(2))]
+            return IRInstruction(None, bare.group(1), operands, block, line_index)
+
+        return None
+
+    def _link_users(self):
+        """根据操作数建立def-use边"""
+        for inst in self.instructions:
+            for operand in inst.operands:
+                definition = self.definitions.get(operand)
+                if definition is not None and inst not in definition.users:
+                    definition.users.append(inst)
+
+    def instructions_matching(self, match: str) -> List[IRInstruction]:
+        """返回opcode或调用目标匹配的指令，按行号排序
+
+        与IRScope一致：字面模式按子串匹配，``/.../`` 按正则匹配；
+        只在不同opcode和调用目标上匹配，不逐行扫描。
+        """
+        matched: Dict[int, IRInstruction] = {}
+        for symbol_index in (self.opcode_index, self.target_index):
+            for symbol, insts in symbol_index.items():
+                if IRScope._contains(symbol, match):
+                    for inst in insts:
+                        matched[inst.line_index] = inst
+        return [matched[line_index] for line_index in sorted(matched)]
+
+    def users_of(self, value_id: str) -> List[IRInstruction]:
+        """返回使用指定值的指令"""
+        definition = self.definitions.get(value_id)
+        return list(definition.users) if definition else []
+
+
+class AmbiguousMethodError(LookupError):
+    """方法名匹配到多个不同的方法"""
+
+
+class MethodTable:
+    """ir_dump目录的方法名表：规范化方法名 -> 按pass顺序排列的IR文件
+
+    方法名优先取自IR文件的 ``Method:`` 头，没有时从文件名中去掉序号前缀和pass名得到。
+    查找顺序为精确匹配、边界前缀匹配（``concat_loop1`` 不会匹配 ``concat_loop10``），
+    最后是兼容旧行为的边界子串匹配；匹配到多个方法时抛出AmbiguousMethodError。
+    """
+
+    # 与checker.rb保持一致的方法名处理
+    SPECIAL_CHARS = re.compile(r'::|[<>]|\.|-')
+    FILE_NAME = re.compile(r'^\d+_pass_\d+_(.+)_([^_]+)\.ir$')
+
+    # 每个目录只缓存一张表：目录 -> ((目录mtime, 文件数, 最新文件mtime), 表)
+    _cache: Dict[str, Tuple[Tuple[int, int, int], 'MethodTable']] = {}
+
+    def __init__(self, ir_dump_dir: str):
+        self.files: Dict[str, List[str]] = {}
+        for ir_file in sorted(glob.glob(os.path.join(ir_dump_dir, "*.ir"))):
+            self.files.setdefault(self._method_key(ir_file), []).append(ir_file)
+
+        # 每个方法名在边界位置的所有前缀 -> 方法名集合
+        self.prefixes: Dict[str, Set[str]] = {}
+        for key in self.files:
+            for i, char in enumerate(key):
+                if i > 0 and not char.isalnum():
+                    self.prefixes.setdefault(key[:i], set()).add(key)
+
+    @classmethod
+    def normalize(cls, method: str) -> str:
+        """处理方法名，将特殊字符替换为下划线"""
+        return cls.SPECIAL_CHARS.sub('_', method)
+
+    @classmethod
+    def for_dir(cls, ir_dump_dir: str) -> 'MethodTable':
+        """返回目录对应的方法名表，目录或其中的IR文件变化后重新构建
+
+        IR文件被原地改写时目录mtime不变，因此同时比较最新的文件mtime。
+        """
+        ir_files = [entry for entry in os.scandir(ir_dump_dir) if entry.name.endswith(".ir")]
+        key = (os.stat(ir_dump_dir).st_mtime_ns, len(ir_files),
+               max((entry.stat().st_mtime_ns for entry in ir_files), default=0))
+        path = os.path.abspath(ir_dump_dir)
+        cached = cls._cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        table = cls(ir_dump_dir)
+        cls._cache[path] = (key, table)
+        return table
+
+    def _method_key(self, ir_file: str) -> str:
+        """取得IR文件所属方法的规范化名称"""
+        with open(ir_file, 'r', encoding='utf-8', errors='replace') as f:
+            header = f.readline()
+        if header.startswith("Method:"):
+            tokens = header[len("Method:"):].split()
+            # 头中可能带有返回类型或地址，取带 "::" 的部分作为方法名
+            names = [token for token in tokens if '::' in token] or tokens
+            if names:
+                return self.normalize(names[0])
+
+        name = os.path.basename(ir_file)
+        match = self.FILE_NAME.match(name)
+        return match.group(1) if match else os.path.splitext(name)[0]
+
+    def resolve(self, method: str) -> List[str]:
+        """查找规范化方法名对应的IR文件，找不到时返回空列表"""
+        if method in self.files:
+            return self.files[method]
+
+        candidates = self.prefixes.get(method)
+        if not candidates:
+            # 兼容省略模块前缀的写法，要求两侧都在名称边界上
+            pattern = re.compile(r'(?<![A-Za-z0-9])' + re.escape(method) + r'(?![A-Za-z0-9])')
+            candidates = {key for key in self.files if pattern.search(key)}
+
+        if len(candidates) > 1:
+            raise AmbiguousMethodError(
+                f"Ambiguous method {method}, candidates: {', '.join(sorted(candidates))}")
+        if candidates:
+            return self.files[candidates.pop()]
+        return []
+
+
 class ETSChecker:
     """ETS IR验证器"""
 
-    def __init__(self, work_dir: str = "/tmp/ets_checker"):
+    # 带模式参数的验证指令及其参数格式，取出的模式不含斜杠，按字面子串匹配
+    PATTERN_ARGUMENTS = {
+        "IN_BLOCK": re.compile(r'/([^/]+)/'),
+        "INST": re.compile(r'/([^/]+)/'),
+        "INST_NOT": re.compile(r'/([^/]+)/'),
+        # 格式: /pattern/,count
+        "INST_COUNT": re.compile(r'/([^/]+)/,(\d+)'),
+    }
+
+    def __init__(self, work_dir: str = "/tmp/ets_checker", ir_model: bool = False,
+                 directive_timeout: Optional[float] = None):
         self.work_dir = Path(work_dir)
+        # 启用后INST_NOT/INST_COUNT基于解析后的指令图按opcode或调用目标匹配
+        self.ir_model = ir_model
+        # 单条验证指令的执行时间预算（秒），超时后该测试判为timeout
+        self.directive_timeout = directive_timeout
 
         # 检查工作目录是否存在
         if not self.work_dir.exists():
@@ -158,11 +745,17 @@ class ETSChecker:
         self.current_pass: Optional[str] = None
         self.ir_scope: Optional[IRScope] = None
         self.ir_files: List[str] = []
+        self.ir_history: Optional[IRHistory] = None
         self.current_file_index: int = 0
+        # 最近选中的几个pass的行号索引，在这些pass之间来回切换时复用
+        self._ir_indexes: 'OrderedDict[str, IRIndex]' = OrderedDict()
+        # ir_dump目录的方法名表，每次运行只检查一次目录是否变化
+        self._method_table: Optional[MethodTable] = None
 
         # 验证结果
         self.errors: List[str] = []
         self.warnings: List[str] = []
+        self.timed_out = False
 
     def raise_error(self, message: str):
         """记录错误"""
@@ -177,25 +770,60 @@ class ETSChecker:
         """记录信息"""
         print(f"INFO: {message}")
 
+    @property
+    def method_table(self) -> MethodTable:
+        """本次运行使用的方法名表（首次访问时取得，之后的METHOD不再扫描目录）"""
+        if self._method_table is None:
+            self._method_table = MethodTable.for_dir(str(self.work_dir / "ir_dump"))
+        return self._method_table
+
+    # 缓存行号索引的pass数量上限
+    IR_INDEX_CACHE_SIZE = 4
+
+    def _load_ir_scope(self, file_index: int) -> IRScope:
+        """从pass历史加载IR文件的搜索范围，行号索引只缓存最近的几个pass"""
+        ir_file = self.ir_files[file_index]
+        index = self._ir_indexes.get(ir_file)
+        if index is None:
+            index = IRIndex(self.ir_history.lines_at(file_index))
+            self._ir_indexes[ir_file] = index
+            if len(self._ir_indexes) > self.IR_INDEX_CACHE_SIZE:
+                self._ir_indexes.popitem(last=False)
+        else:
+            self._ir_indexes.move_to_end(ir_file)
+        return IRScope(index.lines, 'IR', index=index)
+
+    def pass_changes(self, pass_name: str) -> Optional[PassChanges]:
+        """查询当前方法中指定pass相对前一个dump的变化"""
+        for i, ir_file in enumerate(self.ir_files):
+            if pass_name in os.path.basename(ir_file):
+                return self.ir_history.changes(i)
+        return None
+
     def METHOD(self, match: str):
         """选择要验证的方法"""
         self.current_method = match
         self.log_info(f"Selecting method: {match}")
 
         # 处理方法名，将特殊字符替换为下划线（与checker.rb保持一致）
-        processed_method = re.sub(r'::|[<>]|\.|-', '_', match)
+        processed_method = MethodTable.normalize(match)
         self.log_info(f"Processed method name: {processed_method}")
 
-        # 查找包含处理后方法名的IR文件
-        ir_pattern = self.work_dir / "ir_dump" / f"*{processed_method}*.ir"
-        self.ir_files = sorted(glob.glob(str(ir_pattern)))
+        # 在方法名表中查找对应的IR文件
+        try:
+            self.ir_files = self.method_table.resolve(processed_method)
+        except AmbiguousMethodError as e:
+            self.ir_files = []
+            self.raise_error(str(e))
+            return
 
         if not self.ir_files:
             self.raise_error(f"IR dumps not found for method: {processed_method}")
             return
 
+        self.ir_history = IRHistory(self.ir_files)
         self.current_file_index = 0
-        self.ir_scope = IRScope.from_file(self.ir_files[self.current_file_index], 'IR')
+        self.ir_scope = self._load_ir_scope(self.current_file_index)
         self.log_info(f"Loaded IR file: {self.ir_files[self.current_file_index]}")
         self.log_info(f"Found {len(self.ir_files)} IR files for method: {match}")
 
@@ -208,7 +836,7 @@ class ETSChecker:
         for i, ir_file in enumerate(self.ir_files):
             if pass_name in os.path.basename(ir_file):
                 self.current_file_index = i - 1 if i > 0 else 0
-                self.ir_scope = IRScope.from_file(self.ir_files[self.current_file_index], 'IR')
+                self.ir_scope = self._load_ir_scope(self.current_file_index)
                 self.log_info(f"Loaded IR file: {self.ir_files[self.current_file_index]}")
                 return
 
@@ -223,7 +851,7 @@ class ETSChecker:
         for i, ir_file in enumerate(self.ir_files):
             if pass_name in os.path.basename(ir_file):
                 self.current_file_index = i
-                self.ir_scope = IRScope.from_file(self.ir_files[self.current_file_index], 'IR')
+                self.ir_scope = self._load_ir_scope(self.current_file_index)
                 self.log_info(f"Loaded IR file: {self.ir_files[self.current_file_index]}")
                 return
 
@@ -261,7 +889,10 @@ class ETSChecker:
             return
 
         self.log_info(f"Verifying instruction not present: {match}")
-        exists = self.ir_scope.exists(match)
+        if self.ir_model:
+            exists = self.ir_scope.exists_instruction(match)
+        else:
+            exists = self.ir_scope.exists(match)
         if exists:
             self.raise_error(f"Instruction should not exist: {match}")
 
@@ -271,7 +902,10 @@ class ETSChecker:
             self.raise_error("No IR scope selected")
             return
 
-        actual_count = self.ir_scope.count(match)
+        if self.ir_model:
+            actual_count = self.ir_scope.count_instructions(match)
+        else:
+            actual_count = self.ir_scope.count(match)
         self.log_info(f"Counting instruction: {match}, expected: {expected_count}, actual: {actual_count}")
 
         if actual_count != expected_count:
@@ -287,6 +921,7 @@ class ETSChecker:
             lines = f.readlines()
 
         # 解析验证指令
+        directives = []
         for line_num, line in enumerate(lines, 1):
             line = line.strip()
 
@@ -301,9 +936,17 @@ class ETSChecker:
 
             command = parts[0]
             args = parts[1] if len(parts) > 1 else ""
+            directives.append((line_num, command, args))
 
+        for line_num, command, args in directives:
             try:
-                self._execute_command(command, args, line_num)
+                with directive_time_budget(self.directive_timeout):
+                    self._execute_command(command, args, line_num)
+            except DirectiveTimeout:
+                # 超时的测试不再继续执行后续指令
+                self.timed_out = True
+                self.raise_error(f"Command '{command}' at line {line_num} exceeded time budget of {self.directive_timeout}s")
+                break
             except Exception as e:
                 self.raise_error(f"Error executing command '{command}' at line {line_num}: {e}")
 
@@ -338,7 +981,7 @@ class ETSChecker:
 
         elif command == "IN_BLOCK":
             # 解析块名称
-            block_match = re.search(r'/([^/]+)/', args)
+            block_match = self.PATTERN_ARGUMENTS[command].search(args)
             if block_match:
                 self.IN_BLOCK(block_match.group(1))
             else:
@@ -346,7 +989,7 @@ class ETSChecker:
 
         elif command == "INST":
             # 解析指令模式
-            inst_match = re.search(r'/([^/]+)/', args)
+            inst_match = self.PATTERN_ARGUMENTS[command].search(args)
             if inst_match:
                 self.INST(inst_match.group(1))
             else:
@@ -354,7 +997,7 @@ class ETSChecker:
 
         elif command == "INST_NOT":
             # 解析指令模式
-            inst_match = re.search(r'/([^/]+)/', args)
+            inst_match = self.PATTERN_ARGUMENTS[command].search(args)
             if inst_match:
                 self.INST_NOT(inst_match.group(1))
             else:
@@ -363,7 +1006,7 @@ class ETSChecker:
         elif command == "INST_COUNT":
             # 解析指令计数
             # 格式: /pattern/,count
-            count_match = re.search(r'/([^/]+)/,(\d+)', args)
+            count_match = self.PATTERN_ARGUMENTS[command].search(args)
             if count_match:
                 pattern = count_match.group(1)
                 count = int(count_match.group(2))
@@ -395,6 +1038,82 @@ class ETSChecker:
             self.log_info("Validation completed successfully!")
             return True
 
+def parse_shard(value: str) -> Tuple[int, int]:
+    """解析 --shard K/N 参数，K从1开始"""
+    match = re.fullmatch(r'(\d+)/(\d+)', value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid shard format: {value} (expected K/N)")
+    shard_index, shard_count = int(match.group(1)), int(match.group(2))
+    if shard_count < 1 or not 1 <= shard_index <= shard_count:
+        raise argparse.ArgumentTypeError(f"Invalid shard: {value} (expected 1 <= K <= N)")
+    return shard_index, shard_count
+
+
+def discover_test_files(paths: List[str]) -> List[str]:
+    """收集测试文件，目录按递归查找 .ets 文件，结果排序去重"""
+    test_files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            test_files.update(str(p) for p in Path(path).rglob("*.ets"))
+        else:
+            test_files.add(path)
+    return sorted(test_files)
+
+
+def load_timings(timings_file: str) -> Dict[str, float]:
+    """读取历史运行时间（秒），文件不存在或损坏时返回空字典"""
+    try:
+        with open(timings_file, 'r', encoding='utf-8') as f:
+            timings = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(timings, dict):
+        return {}
+    return {name: float(duration) for name, duration in timings.items()
+            if isinstance(duration, (int, float))}
+
+
+def save_timings(timings_file: str, durations: Dict[str, float]):
+    """把本次运行时间合并写入时间文件"""
+    timings = load_timings(timings_file)
+    timings.update(durations)
+    with open(timings_file, 'w', encoding='utf-8') as f:
+        json.dump(timings, f, indent=2, sort_keys=True)
+
+
+def partition_tests(test_files: List[str], shard_index: int, shard_count: int,
+                    timings: Dict[str, float]) -> List[str]:
+    """按历史运行时间把测试文件确定性地分配到各分片，返回第shard_index个分片（从1开始）
+
+    使用最长处理时间优先的贪心分配：按耗时从大到小（同耗时按路径）依次放入当前总耗时最小的分片。
+    没有历史记录的文件按已知耗时的平均值估算。
+    """
+    known = [timings[name] for name in test_files if name in timings]
+    default_duration = sum(known) / len(known) if known else 1.0
+
+    loads = [0.0] * shard_count
+    shards: List[List[str]] = [[] for _ in range(shard_count)]
+    weighted = sorted(test_files, key=lambda name: (-timings.get(name, default_duration), name))
+    for name in weighted:
+        target = min(range(shard_count), key=lambda i: (loads[i], i))
+        loads[target] += timings.get(name, default_duration)
+        shards[target].append(name)
+    return sorted(shards[shard_index - 1])
+
+
+def shard_plan_hash(test_files: List[str], timings: Dict[str, float]) -> str:
+    """分片计划的指纹：由发现的测试文件列表和它们的历史运行时间决定
+
+    各分片的指纹一致时，它们的分配才互不重叠且覆盖全部测试。
+    """
+    plan = {"test_files": test_files,
+            "timings": {name: timings[name] for name in test_files if name in timings}}
+    return hashlib.sha256(json.dumps(plan, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+DEFAULT_TIMINGS_FILE = 'ets_checker_timings.json'
+
+
 def main():
     """主函数"""
     # 打印完整的Python命令
@@ -402,20 +1121,65 @@ def main():
     print(f"Command: {' '.join(sys.argv)}")
 
     parser = argparse.ArgumentParser(description='ETS IR验证器')
-    parser.add_argument('test_file', help='测试文件路径')
+    parser.add_argument('test_files', nargs='+', help='测试文件路径或包含 .ets 文件的目录')
     parser.add_argument('--work-dir', default='/tmp/ets_checker', help='工作目录')
     parser.add_argument('--verbose', '-v', action='store_true', help='详细输出')
+    parser.add_argument('--ir-model', action='store_true',
+                        help='基于解析后的指令图执行INST_NOT/INST_COUNT（按opcode或调用目标子串匹配）')
+    parser.add_argument('--directive-timeout', type=float, metavar='SECONDS',
+                        help='单条验证指令的执行时间预算，超时的测试判为timeout')
+    parser.add_argument('--shard', type=parse_shard, metavar='K/N',
+                        help='只运行N个分片中的第K个（按历史运行时间均衡分配）')
+    parser.add_argument('--timings',
+                        help=f'历史运行时间文件（使用--shard时默认读取{DEFAULT_TIMINGS_FILE}）；'
+                             '分片运行只读取，不分片时运行后写入本次的耗时')
+    parser.add_argument('--results', help='把本分片的结构化结果写入JSON文件，供merge_results.py合并')
 
     args = parser.parse_args()
 
-    # 创建验证器
-    checker = ETSChecker(args.work_dir)
-
-    # 运行验证
-    success = checker.run_validation(args.test_file)
+    # 分片运行只读取历史运行时间，保证各节点基于同一时间文件分片；
+    # 时间文件由 merge_results.py --timings 或不分片时显式指定的 --timings 写入
+    timings_file = args.timings
+    if timings_file is None and args.shard:
+        timings_file = DEFAULT_TIMINGS_FILE
+    timings = load_timings(timings_file) if timings_file else {}
+
+    shard_index, shard_count = args.shard or (1, 1)
+    all_test_files = discover_test_files(args.test_files)
+    test_files = partition_tests(all_test_files, shard_index, shard_count, timings)
+    print(f"INFO: Shard {shard_index}/{shard_count}: {len(test_files)} test files")
+
+    # 每个测试文件使用独立的验证器运行
+    results = []
+    for test_file in test_files:
+        checker = ETSChecker(args.work_dir, ir_model=args.ir_model,
+                             directive_timeout=args.directive_timeout)
+        start = time.perf_counter()
+        success = checker.run_validation(test_file)
+        if checker.timed_out:
+            status = "timeout"
+        else:
+            status = "passed" if success else "failed"
+        results.append({
+            "test_file": test_file,
+            "status": status,
+            "errors": checker.errors,
+            "duration": time.perf_counter() - start,
+        })
+
+    if args.timings and not args.shard:
+        save_timings(args.timings, {result["test_file"]: result["duration"] for result in results})
+    if args.results:
+        with open(args.results, 'w', encoding='utf-8') as f:
+            json.dump({
+                "shard": f"{shard_index}/{shard_count}",
+                "plan": shard_plan_hash(all_test_files, timings),
+                "test_files": all_test_files,
+                "results": results,
+            }, f, indent=2)
 
     # 返回退出码
-    exit(0 if success else 1)
+    exit(0 if all(result["status"] == "passed" for result in results) else 1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合并各分片（ets_checker.py --shard K/N --results FILE）的结构化结果
+"""
+
+import json
+import argparse
+from collections import Counter
+from typing import List, Dict
+
+from ets_checker import save_timings
+
+
+def merge_results(result_files: List[str]) -> Dict:
+    """合并分片结果，检查分片计划是否一致、分片是否完整、每个测试是否恰好运行一次"""
+    shards = {}
+    plans = set()
+    expected = set()
+    results = []
+    for result_file in result_files:
+        with open(result_file, 'r', encoding='utf-8') as f:
+            shard_result = json.load(f)
+        shards[shard_result["shard"]] = result_file
+        plans.add(shard_result.get("plan"))
+        expected.update(shard_result.get("test_files", []))
+        results.extend(shard_result["results"])
+
+    # 根据 K/N 检查缺失的分片
+    shard_counts = {int(shard.split('/')[1]) for shard in shards}
+    missing = []
+    for shard_count in sorted(shard_counts):
+        for shard_index in range(1, shard_count + 1):
+            if f"{shard_index}/{shard_count}" not in shards:
+                missing.append(f"{shard_index}/{shard_count}")
+
+    # 各分片使用不同的测试列表或时间文件时，分配可能重叠或遗漏
+    counts = Counter(result["test_file"] for result in results)
+    duplicated = sorted(name for name, count in counts.items() if count > 1)
+    dropped = sorted(expected - set(counts))
+
+    results.sort(key=lambda result: result["test_file"])
+    return {
+        "shards": sorted(shards),
+        "missing_shards": missing,
+        "plan_mismatch": len(plans) > 1 or len(shard_counts) > 1,
+        "duplicated": duplicated,
+        "dropped": dropped,
+        "total": len(results),
+        "passed": sum(1 for result in results if result["status"] == "passed"),
+        "failed": [result["test_file"] for result in results if result["status"] != "passed"],
+        "results": results,
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='合并ETS IR验证器的分片结果')
+    parser.add_argument('result_files', nargs='+', help='各分片的结果文件')
+    parser.add_argument('--output', '-o', help='合并后的结果文件')
+    parser.add_argument('--timings', help='把各测试的耗时合并写入历史运行时间文件')
+
+    args = parser.parse_args()
+
+    report = merge_results(args.result_files)
+
+    print(f"Shards: {', '.join(report['shards'])}")
+    print(f"Total: {report['total']}, passed: {report['passed']}, failed: {len(report['failed'])}")
+    for result in report["results"]:
+        if result["status"] != "passed":
+            print(f"  - {result['status'].upper()}: {result['test_file']}")
+    for shard in report["missing_shards"]:
+        print(f"  - MISSING SHARD: {shard}")
+    if report["plan_mismatch"]:
+        print("  - PLAN MISMATCH: shards were partitioned from different test lists or timings")
+    for test_file in report["duplicated"]:
+        print(f"  - DUPLICATED: {test_file}")
+    for test_file in report["dropped"]:
+        print(f"  - DROPPED: {test_file}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.timings:
+        save_timings(args.timings, {result["test_file"]: result["duration"]
+                                    for result in report["results"]})
+
+    # 返回退出码
+    consistent = not (report["missing_shards"] or report["plan_mismatch"]
+                      or report["duplicated"] or report["dropped"])
+    exit(0 if not report["failed"] and consistent else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试IRScope及解析后的IR模型
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from ets_checker import (IRScope, IRIndex, IRHistory, ETSChecker, UnsafePatternError,
+                         check_pattern)
+
+
+# Ark格式的IR片段
+ARK_IR = """Method: ets_string_concat_loop.ETSGLOBAL::concat_loop0
+BB 0
+prop: start
+    0.ref  Parameter                  arg 0 -> (v2, v3)
+    1.ref  LoadString                 'a' -> (v2)
+succs: [bb 1]
+
+BB 1  preds: [bb 0]
+prop: loop
+    2.ref  Intrinsic.StdCoreSbAppendString v0, v1 -> (v3)
+    3.ref  Intrinsic.StdCoreSbAppendString2 v2, v0 -> (v4)
+    4.ref  Intrinsic.StdCoreSbToString v3
+""".splitlines(keepends=True)
+
+# 示例文件中的简化格式
+SIMPLE_IR = """Method: ets_string_concat_loop.ETSGLOBAL::concat_loop0
+BB 0 (loop)
+  v0 = StringBuilder::<ctor>()
+  v1 = Intrinsic.StdCoreSbAppendString(v0, v2)
+  v3 = Intrinsic.StdCoreSbAppendString(v1, v4)
+  v5 = Intrinsic.StdCoreSbToString(v3)
+  return v5
+""".splitlines(keepends=True)
+
+
+def test_ark_graph():
+    """测试Ark格式的解析与def-use边"""
+    print("=== 测试Ark格式IR解析 ===\n")
+
+    graph = IRScope(ARK_IR, "IR").graph
+    print(f"指令数: {len(graph.instructions)}")
+    assert [inst.id for inst in graph.instructions] == ["v0", "v1", "v2", "v3", "v4"]
+    assert graph.blocks["1"].props == "loop"
+    assert graph.definitions["v2"].operands == ["v0", "v1"]
+    assert graph.definitions["v2"].block == "1"
+    assert [inst.id for inst in graph.users_of("v0")] == ["v2", "v3"]
+    assert [inst.id for inst in graph.users_of("v3")] == ["v4"]
+    print("✓ Ark格式解析测试完成!")
+
+
+def test_simple_graph():
+    """测试简化格式的解析"""
+    print("\n=== 测试简化格式IR解析 ===\n")
+
+    graph = IRScope(SIMPLE_IR, "IR").graph
+    assert graph.blocks["0"].props == "loop"
+    assert len(graph.opcode_index["Intrinsic.StdCoreSbAppendString"]) == 2
+    assert [inst.opcode for inst in graph.users_of("v5")] == ["return"]
+    print("✓ 简化格式解析测试完成!")
+
+
+def test_instruction_count():
+    """测试按指令计数与按文本计数的区别"""
+    print("\n=== 测试指令计数 ===\n")
+
+    scope = IRScope(ARK_IR, "IR")
+    print(f"文本计数: {scope.count('v0')}")
+    print(f"指令计数: {scope.count_instructions('v0')}")
+    # 字面模式始终按子串匹配opcode，与文本匹配规则一致
+    assert scope.count_instructions("Intrinsic.StdCoreSbAppendString") == 2
+    assert scope.count_instructions("StdCoreSb") == 3
+    assert scope.count_instructions("/AppendString\\d/") == 1
+    # 只在操作数中出现的值不算作指令
+    assert scope.count("v0") == 2
+    assert scope.count_instructions("v0") == 0
+    assert scope.count_instructions("ETSGLOBAL") == 0
+
+    # 只有更长的opcode时结果不受其他opcode是否存在的影响
+    only_longer = IRScope(ARK_IR[:9] + ARK_IR[10:], "IR")
+    assert only_longer.count_instructions("Intrinsic.StdCoreSbAppendString") == 1
+    assert only_longer.count_instructions("Intrinsic.StdCoreSbAppendString2") == 1
+
+    scope.current_index = len(ARK_IR)
+    assert not scope.exists_instruction("Intrinsic.StdCoreSbToString")
+    print("✓ 指令计数测试完成!")
+
+
+def test_call_target():
+    """测试调用指令的目标方法参与匹配"""
+    print("\n=== 测试调用目标 ===\n")
+
+    lines = [
+        "BB 0\n",
+        "prop: start\n",
+        "    5.ref  LoadString                 'a' -> (v6)\n",
+        "    6.ref  CallStatic.Inlined 123 std.core.StringBuilder::<ctor> v5 -> (v7)\n",
+        "    7.ref  CallVirtual 45 std.core.StringBuilder::toString v6\n",
+    ]
+    scope = IRScope(lines, "IR")
+    call = scope.graph.definitions["v6"]
+    assert call.opcode == "CallStatic.Inlined"
+    assert call.target == "std.core.StringBuilder::<ctor>"
+    assert call.operands == ["v5"]
+    assert scope.count("StringBuilder::<ctor>") == 1
+    assert scope.count_instructions("StringBuilder::<ctor>") == 1
+    assert scope.count_instructions("StringBuilder") == 2
+    assert scope.count_instructions("CallStatic") == 1
+    print("✓ 调用目标测试完成!")
+
+
+def test_indexed_scope():
+    """测试倒排索引与逐行扫描结果一致"""
+    print("\n=== 测试倒排索引 ===\n")
+
+    # 只查询一次的文件不建立索引
+    index = IRIndex(ARK_IR)
+    assert index.positions("StdCoreSbAppendString") is None
+    assert not index.built
+    assert index.positions("StdCoreSbAppendString") == [9, 10]
+    assert index.built
+    assert index.positions("v0, v1") == [9]
+    assert index.positions("prop: loop") == [8]
+    # 正则回退到逐行扫描
+    assert index.positions("/v\\d+/") is None
+
+    patterns = ["Intrinsic.StdCoreSbAppendString", "StdCoreSbToString", "Parameter",
+                "ETSGLOBAL", "/AppendString\\d/", "v0, v1", "missing"]
+    for pattern in patterns:
+        plain = IRScope(ARK_IR, "IR")
+        indexed = IRScope(index.lines, "IR", index=index)
+        assert plain.count(pattern) == indexed.count(pattern), pattern
+        assert plain.exists(pattern) == indexed.exists(pattern), pattern
+        assert plain.find(pattern) == indexed.find(pattern), pattern
+        assert plain.current_index == indexed.current_index, pattern
+        print(f"{pattern}: count={indexed.count(pattern)}")
+
+    # 基本块范围共享文件索引，含空格的 "prop: x" 同样由索引回答
+    scope = IRScope(index.lines, "IR", index=index)
+    assert scope._indexed_range("prop: start", 0) is not None
+    block = scope.find_block("prop: start")
+    assert block.index is index and block.offset == 2
+    assert block.count("StdCoreSbAppendString") == 0
+    assert block.count("Parameter") == 1
+    block = scope.find_block("prop: loop")
+    assert block.count("StdCoreSbAppendString") == 2
+    assert block.find("StdCoreSbToString").strip().startswith("4.ref")
+    assert not block.exists("StdCoreSbToString")
+    print("✓ 倒排索引测试完成!")
+
+
+def test_index_faster_than_scan():
+    """基准：同一文件被反复查询时，索引比逐行扫描快"""
+    print("\n=== 索引基准测试 ===\n")
+
+    lines = ["Method: mod.ETSGLOBAL::bench\n"]
+    for block in range(2000):
+        lines.append(f"BB {block}\n")
+        lines.append(f"prop: b{block}\n")
+        for k in range(10):
+            i = block * 10 + k
+            lines.append(f"   {i}.ref  Intrinsic.StdCoreSbAppendString{k % 3} v{i - 1}, v{i - 2} "
+                         f"-> (v{i + 1}) bc: 0x{i:08x}\n")
+    patterns = ["Intrinsic.StdCoreSbAppendString", "StdCoreSbAppendString2", "StringBuilder::<ctor>"]
+
+    def run(index):
+        start = time.perf_counter()
+        for _ in range(10):
+            scope = IRScope(lines, "IR", index=index)
+            counts = [scope.count(pattern) for pattern in patterns]
+            counts.append(scope.exists("Intrinsic.StdCoreSbToString"))
+        return time.perf_counter() - start, counts
+
+    scan_time, scan_counts = run(None)
+    index_time, index_counts = run(IRIndex(lines))
+    print(f"逐行扫描: {scan_time * 1000:.1f}ms, 索引: {index_time * 1000:.1f}ms")
+    assert index_counts == scan_counts
+    assert index_time < scan_time
+    print("✓ 索引基准测试完成!")
+
+
+def test_pass_history():
+    """测试pass历史的差异存储与还原"""
+    print("\n=== 测试pass历史 ===\n")
+
+    dumps = [
+        SIMPLE_IR,
+        SIMPLE_IR[:2] + ["  v0 = StringBuilder::<ctor>()\n", "BB 1 (loop)\n"] + SIMPLE_IR[3:],
+        SIMPLE_IR[:2] + ["  v0 = StringBuilder::<ctor>()\n", "BB 1 (loop)\n"] + SIMPLE_IR[3:],
+        SIMPLE_IR[:3] + SIMPLE_IR[4:],
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ir_files = []
+        for i, lines in enumerate(dumps):
+            ir_file = Path(tmp_dir) / f"{i:03d}_pass_{i:04d}_method_Pass{i}.ir"
+            ir_file.write_text("".join(lines), encoding="utf-8")
+            ir_files.append(str(ir_file))
+
+        history = IRHistory(ir_files)
+        for i, lines in enumerate(dumps):
+            assert history.lines_at(i) == lines, i
+        # 只选择pass时不计算差异
+        assert history.deltas == {}
+
+        changes = history.changes(1)
+        print(f"Pass1: +{len(changes.added)} -{len(changes.removed)}")
+        assert changes.added == ["BB 1 (loop)\n"]
+        assert changes.removed == []
+        assert history.changes(2).added == [] and history.changes(2).removed == []
+        assert history.changes(3).removed == ["BB 1 (loop)\n", SIMPLE_IR[3]]
+        assert history.changes(0).added == dumps[0]
+        # 差异链完整后由base还原
+        assert history.lines_at(3) == dumps[3]
+
+    # 含重复行时差异仍能正确还原
+    old = ["a\n", "x\n", "b\n", "x\n", "c\n", "x\n"]
+    new = ["x\n", "a\n", "b\n", "y\n", "x\n", "c\n", "c\n"]
+    assert IRHistory._apply(old, IRHistory._diff(old, new)) == new
+    assert IRHistory._diff(new, new) == []
+
+    # 外提一条指令只算作一次删除和一次新增
+    old = [f"   {i}.ref  Op{i} v{i - 1}\n" for i in range(10)]
+    new = [old[-1]] + old[:-1]
+    delta = IRHistory._diff(old, new)
+    assert IRHistory._apply(old, delta) == new
+    removed = [line for i1, i2, _ in delta for line in old[i1:i2]]
+    added = [line for _, _, new_lines in delta for line in new_lines]
+    assert removed == [old[-1]] and added == [old[-1]]
+    print("✓ pass历史测试完成!")
+
+
+def test_pattern_guard():
+    """测试正则风险分析与指令时间预算"""
+    print("\n=== 测试正则安全检查 ===\n")
+
+    for pattern in ["(a+)+$", "(\\w*)*x", "(a|b+){2,}", "(x)\\1"]:
+        print(f"{pattern}: {check_pattern(pattern)}")
+        assert check_pattern(pattern) is not None, pattern
+    for pattern in ["Intrinsic\\.StdCoreSb\\w+", "v\\d+", "(foo|bar)+", "\\(a+\\)+"]:
+        assert check_pattern(pattern) is None, pattern
+
+    scope = IRScope(["a" * 40 + "b\n"], "IR")
+    try:
+        scope.exists("/(a+)+$/")
+        assert False, "unsafe pattern accepted"
+    except UnsafePatternError:
+        pass
+    assert scope.exists("/a+b/")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ir_dump = Path(tmp_dir) / "ir_dump"
+        ir_dump.mkdir()
+        (ir_dump / "001_pass_0001_mod_ETSGLOBAL_slow_Pass.ir").write_text(
+            "Method: mod.ETSGLOBAL::slow\n" + "a" * 200 + "\n", encoding="utf-8")
+        test_file = Path(tmp_dir) / "slow.ets"
+        test_file.write_text('//! METHOD "mod.ETSGLOBAL::slow"\n//! INST /x/\n', encoding="utf-8")
+
+        # 极小的时间预算使第一条指令必然超时
+        checker = ETSChecker(tmp_dir, directive_timeout=1e-6)
+        assert not checker.run_validation(str(test_file))
+        assert checker.timed_out
+
+        # 指令中的模式按字面匹配，形似有风险的正则也不会被拒绝
+        (ir_dump / "001_pass_0001_mod_ETSGLOBAL_slow_Pass.ir").write_text(
+            "Method: mod.ETSGLOBAL::slow\n" + "a" * 200 + "(a+)+b\n", encoding="utf-8")
+        test_file.write_text('//! METHOD "mod.ETSGLOBAL::slow"\n//! INST /(a+)+b/\n'
+                             '//! INST_COUNT /(a+)+b/,1\n', encoding="utf-8")
+        checker = ETSChecker(tmp_dir)
+        assert checker.run_validation(str(test_file)), checker.errors
+        assert not checker.timed_out
+    print("✓ 正则安全检查测试完成!")
+
+
+def main():
+    """主函数"""
+    test_ark_graph()
+    test_simple_graph()
+    test_instruction_count()
+    test_call_target()
+    test_indexed_scope()
+    test_index_faster_than_scan()
+    test_pass_history()
+    test_pattern_guard()
+    print("\n测试完成!")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,15 @@
 测试METHOD方法名处理的正确性
 """
 
+import os
 import re
 import subprocess
 import sys
+import tempfile
 from pathlib import Path
 
+from ets_checker import ETSChecker, MethodTable, AmbiguousMethodError
+
 
 def test_method_name_processing():
     """测试方法名处理逻辑"""
@@ -72,6 +76,69 @@ def test_ir_file_matching():
     print(f"总共找到 {len(matching_files)} 个匹配文件")
 
 
+def test_method_table():
+    """测试方法名表的精确、前缀匹配与歧义报告"""
+    print("\n=== 测试方法名表 ===\n")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ir_dump = Path(tmp_dir) / "ir_dump"
+        ir_dump.mkdir()
+        dumps = {
+            "001_pass_0001_mod_ETSGLOBAL_concat_loop1_BranchElimination.ir": "Method: mod.ETSGLOBAL::concat_loop1 0x1\n",
+            "002_pass_0002_mod_ETSGLOBAL_concat_loop1_SimplifyStringBuilder.ir": "",
+            "003_pass_0001_mod_ETSGLOBAL_concat_loop10_BranchElimination.ir": "Method: mod.ETSGLOBAL::concat_loop10\n",
+            "004_pass_0001_mod_Box_T__get_i32_BranchElimination.ir": "Method: mod.Box<T>::get-i32\n",
+            "005_pass_0001_mod_Box_T__get_f64_BranchElimination.ir": "Method: mod.Box<T>::get-f64\n",
+        }
+        for name, content in dumps.items():
+            (ir_dump / name).write_text(content, encoding="utf-8")
+
+        table = MethodTable(str(ir_dump))
+        for key, files in sorted(table.files.items()):
+            print(f"{key}: {len(files)} 个文件")
+
+        # concat_loop1 不再匹配到 concat_loop10
+        files = table.resolve(MethodTable.normalize("mod.ETSGLOBAL::concat_loop1"))
+        assert [Path(f).name[:3] for f in files] == ["001", "002"]
+        files = table.resolve(MethodTable.normalize("ETSGLOBAL::concat_loop10"))
+        assert [Path(f).name[:3] for f in files] == ["003"]
+        files = table.resolve(MethodTable.normalize("mod.Box<T>::get-f64"))
+        assert [Path(f).name[:3] for f in files] == ["005"]
+        assert table.resolve(MethodTable.normalize("mod.ETSGLOBAL::concat_loop2")) == []
+
+        # 原地改写IR文件后重新构建方法名表，每个目录只保留一张表
+        first = MethodTable.for_dir(str(ir_dump))
+        assert MethodTable.for_dir(str(ir_dump)) is first
+        rewritten = ir_dump / "003_pass_0001_mod_ETSGLOBAL_concat_loop10_BranchElimination.ir"
+        rewritten.write_text("Method: mod.ETSGLOBAL::concat_loop11\n", encoding="utf-8")
+        stat = rewritten.stat()
+        os.utime(rewritten, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        table = MethodTable.for_dir(str(ir_dump))
+        assert table is not first
+        assert table.resolve(MethodTable.normalize("mod.ETSGLOBAL::concat_loop11"))
+        assert table.resolve(MethodTable.normalize("mod.ETSGLOBAL::concat_loop10")) == []
+        assert MethodTable._cache[os.path.abspath(str(ir_dump))][1] is table
+
+        # 验证器在一次运行中只取一次方法名表，之后的METHOD不再扫描目录
+        checker = ETSChecker(tmp_dir)
+        checker.METHOD("mod.ETSGLOBAL::concat_loop11")
+        assert checker.method_table is table
+        rewritten.write_text("Method: mod.ETSGLOBAL::concat_loop12\n", encoding="utf-8")
+        os.utime(rewritten, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+        checker.METHOD("mod.ETSGLOBAL::concat_loop11")
+        assert checker.method_table is table and checker.ir_files
+        assert ETSChecker(tmp_dir).method_table is not table
+
+        # 重载方法只给出公共前缀时报告歧义
+        try:
+            table.resolve(MethodTable.normalize("mod.Box<T>::get"))
+            assert False, "ambiguous method resolved"
+        except AmbiguousMethodError as e:
+            print(f"歧义: {e}")
+
+    print("✓ 方法名表测试完成!")
+
+
 def test_checker_integration():
     """测试验证器集成"""
     print("\n=== 测试验证器集成 ===\n")
@@ -110,7 +177,10 @@ def main():
     # 2. 测试IR文件匹配
     test_ir_file_matching()
     
-    # 3. 测试验证器集成
+    # 3. 测试方法名表
+    test_method_table()
+
+    # 4. 测试验证器集成
     test_checker_integration()
     
     print("\n测试完成!")
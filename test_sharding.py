@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按历史运行时间的分片与结果合并
+"""
+
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from ets_checker import discover_test_files, partition_tests, parse_shard, shard_plan_hash
+from merge_results import merge_results
+
+
+def test_partition_by_timings():
+    """测试分片按运行时间均衡且确定"""
+    print("=== 测试测试分片 ===\n")
+
+    test_files = [f"t{i}.ets" for i in range(6)]
+    timings = {"t0.ets": 10.0, "t1.ets": 6.0, "t2.ets": 4.0, "t3.ets": 1.0, "t4.ets": 1.0}
+
+    shards = [partition_tests(test_files, k, 2, timings) for k in (1, 2)]
+    for k, shard in enumerate(shards, 1):
+        print(f"分片 {k}/2: {shard}")
+
+    # 所有文件恰好分配一次
+    assert sorted(shards[0] + shards[1]) == test_files
+    # t5没有历史记录，按平均值4.4估算
+    assert shards == [["t0.ets", "t2.ets"], ["t1.ets", "t3.ets", "t4.ets", "t5.ets"]]
+    assert shards[0] == partition_tests(list(reversed(test_files)), 1, 2, timings)
+    assert partition_tests(test_files, 1, 1, {}) == test_files
+    assert partition_tests(["a.ets"], 2, 3, {}) == []
+    assert parse_shard("2/3") == (2, 3)
+    print("✓ 测试分片测试完成!")
+
+
+def test_discover_and_merge():
+    """测试测试文件发现与分片结果合并"""
+    print("\n=== 测试结果合并 ===\n")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        (tmp / "sub").mkdir()
+        for name in ["b.ets", "sub/a.ets", "notes.txt"]:
+            (tmp / name).write_text("", encoding="utf-8")
+        assert discover_test_files([tmp_dir]) == [str(tmp / "b.ets"), str(tmp / "sub" / "a.ets")]
+
+        plan = shard_plan_hash(["a.ets", "b.ets"], {})
+        shard_results = [
+            {"shard": "1/3", "plan": plan, "test_files": ["a.ets", "b.ets"], "results": [{"test_file": "b.ets", "status": "passed", "errors": [], "duration": 1.0}]},
+            {"shard": "3/3", "plan": plan, "test_files": ["a.ets", "b.ets"], "results": [{"test_file": "a.ets", "status": "failed", "errors": ["x"], "duration": 2.0}]},
+        ]
+        result_files = []
+        for i, shard_result in enumerate(shard_results):
+            result_file = tmp / f"shard{i}.json"
+            result_file.write_text(json.dumps(shard_result), encoding="utf-8")
+            result_files.append(str(result_file))
+
+        report = merge_results(result_files)
+        print(f"合并结果: total={report['total']}, failed={report['failed']}")
+        assert report["total"] == 2 and report["passed"] == 1
+        assert report["failed"] == ["a.ets"]
+        assert report["missing_shards"] == ["2/3"]
+        assert [result["test_file"] for result in report["results"]] == ["a.ets", "b.ets"]
+        assert not report["plan_mismatch"] and not report["duplicated"] and not report["dropped"]
+    print("✓ 结果合并测试完成!")
+
+
+def test_merge_inconsistent_shards():
+    """测试各节点使用不同时间文件时，合并能发现重复和遗漏的测试"""
+    print("\n=== 测试分片一致性检查 ===\n")
+
+    test_files = ["t0.ets", "t1.ets", "t2.ets", "t3.ets"]
+    # 两个节点各自只更新了本分片的耗时
+    node_timings = [{"t0.ets": 5.0, "t3.ets": 1.0}, {"t1.ets": 5.0, "t2.ets": 1.0}]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result_files = []
+        for k, timings in enumerate(node_timings, 1):
+            shard = partition_tests(test_files, k, 2, timings)
+            result_file = Path(tmp_dir) / f"shard{k}.json"
+            result_file.write_text(json.dumps({
+                "shard": f"{k}/2",
+                "plan": shard_plan_hash(test_files, timings),
+                "test_files": test_files,
+                "results": [{"test_file": name, "status": "passed", "errors": [], "duration": 1.0}
+                            for name in shard],
+            }), encoding="utf-8")
+            result_files.append(str(result_file))
+
+        report = merge_results(result_files)
+        print(f"重复: {report['duplicated']}, 遗漏: {report['dropped']}")
+        assert report["plan_mismatch"]
+        assert report["duplicated"] and report["dropped"]
+    print("✓ 分片一致性检查测试完成!")
+
+
+def test_timings_written_only_when_requested():
+    """测试只有不分片且显式指定时才写入历史运行时间文件"""
+    print("\n=== 测试运行时间文件 ===\n")
+
+    checker = str(Path(__file__).resolve().parent / "ets_checker.py")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        (Path(tmp_dir) / "ir_dump").mkdir()
+        test_file = Path(tmp_dir) / "empty.ets"
+        test_file.write_text("", encoding="utf-8")
+
+        subprocess.run([sys.executable, checker, str(test_file), "--work-dir", tmp_dir],
+                       cwd=tmp_dir, capture_output=True)
+        assert not (Path(tmp_dir) / "ets_checker_timings.json").exists()
+
+        timings_file = Path(tmp_dir) / "ets_checker_timings.json"
+        subprocess.run([sys.executable, checker, str(test_file), "--work-dir", tmp_dir,
+                        "--shard", "1/1", "--results", "shard.json"], cwd=tmp_dir, capture_output=True)
+        assert not timings_file.exists()
+
+        # 分片运行只读取时间文件
+        timings_file.write_text(json.dumps({"other.ets": 3.0}), encoding="utf-8")
+        subprocess.run([sys.executable, checker, str(test_file), "--work-dir", tmp_dir,
+                        "--shard", "1/1", "--timings", str(timings_file)], cwd=tmp_dir, capture_output=True)
+        assert json.loads(timings_file.read_text(encoding="utf-8")) == {"other.ets": 3.0}
+
+        # 不分片且显式指定 --timings 时写入
+        subprocess.run([sys.executable, checker, str(test_file), "--work-dir", tmp_dir,
+                        "--timings", str(timings_file)], cwd=tmp_dir, capture_output=True)
+        assert str(test_file) in json.loads(timings_file.read_text(encoding="utf-8"))
+    print("✓ 运行时间文件测试完成!")
+
+
+def main():
+    """主函数"""
+    test_partition_by_timings()
+    test_discover_and_merge()
+    test_merge_inconsistent_shards()
+    test_timings_written_only_when_requested()
+    print("\n测试完成!")
+
+
+if __name__ == "__main__":
+    main()